@@ -5,26 +5,429 @@ This module provides functions to query DESI DR1 data using NOIRLab's TAP servic
 Designed for tutorial use with professional astronomers and students.
 """
 
+import hashlib
+import os
+import shutil
+import threading
+import urllib.error
+import urllib.request
 import warnings
-from typing import Optional, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Optional, Dict, Any, List, Union
 import numpy as np
 import pandas as pd
-from astroquery.utils.tap.core import TapPlus
-from astropy.table import Table
-from tqdm import tqdm
-import time
+
+try:
+    import numexpr as ne  # optional: fused, multi-threaded array expressions
+except ImportError:
+    ne = None
+
+if TYPE_CHECKING:
+    import polars as pl  # optional: only for the query_galaxies(lazy=True) annotation
+
+# Default location for downloaded DR1 files (override with $DESI_CACHE)
+DEFAULT_CACHE_DIR = os.path.join("~", ".cache", "desi")
+
+# Read/write buffer used when streaming downloads to disk
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Seconds to wait on a stalled HTTP connection (connect or read) before
+# giving up, so a dead server cannot hold a download lock forever
+HTTP_TIMEOUT = 60
+
+# Files at least this large are fetched as parallel byte ranges when the
+# server supports it, using DESIDataAccess.download_streams connections
+RANGED_DOWNLOAD_MIN_SIZE = 64 * 1024 * 1024
+DOWNLOAD_STREAMS = 4
+
+# Rows per block when applying cuts to an LSS table
+FITS_BLOCK_ROWS = 200_000
+
+# HTTP read size for remote FITS access with stream=True
+STREAM_BLOCK_SIZE = 8 * 1024 * 1024
+
+# Synthetic SFRs: line flux (erg/s/cm²) -> SFR (M☉/yr) as 4πd²/K, for an
+# assumed luminosity distance of ~1 Gpc (z~0.3 galaxies) and the Kennicutt
+# H-alpha / [OII] calibration constants K
+SYNTHETIC_DISTANCE_CM = 1e9 * 3.086e18
+HALPHA_SFR_PER_FLUX = 4 * np.pi * SYNTHETIC_DISTANCE_CM**2 / 1.26e34
+OII_SFR_PER_FLUX = 4 * np.pi * SYNTHETIC_DISTANCE_CM**2 / 1.4e34
+
+
+def native_dtype_map(df: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Column -> dtype map for a single DataFrame.astype call that makes
+    TARGETID int64 and gives other numeric columns native byte order.
+    
+    Columns are kept at their own width (float32 stays float32) and only
+    columns that actually need converting are listed.
+    """
+    dtype_map = {}
+    for col, dtype in df.dtypes.items():
+        if col == 'TARGETID':
+            if dtype != np.int64:
+                dtype_map[col] = np.int64
+        elif dtype.kind in ('i', 'f') and not dtype.isnative:
+            dtype_map[col] = dtype.newbyteorder('=')
+    return dtype_map
+
+
+def line_flux_ivar(flux: np.ndarray, scale: float) -> np.ndarray:
+    """
+    Synthetic inverse variance scale * (flux / 1e-16)**1.5 for emission lines.
+    
+    Computed in a single output buffer (or one fused numexpr pass) rather
+    than through a chain of full-size temporaries. Both paths apply the
+    same operations as the original expression (divide by 1e-16, then
+    the power), so they agree with it up to the rounding of numexpr's pow.
+    
+    Parameters:
+    -----------
+    flux : np.ndarray
+        Emission line flux in erg/s/cm²
+    scale : float
+        Inverse variance of a 1e-16 erg/s/cm² line
+        
+    Returns:
+    --------
+    np.ndarray
+        Inverse variance of the flux
+    """
+    if ne is not None:
+        return ne.evaluate("scale * (flux / 1e-16)**1.5",
+                           local_dict={"flux": flux, "scale": scale})
+    
+    ivar = flux / 1e-16
+    ivar **= 1.5
+    ivar *= scale
+    return ivar
+
+
+def fractional_ivar(values: np.ndarray, fraction: float) -> np.ndarray:
+    """
+    Inverse variance 1 / (fraction * values)**2 for a fixed fractional error.
+    
+    Parameters:
+    -----------
+    values : np.ndarray
+        Measured values
+    fraction : float
+        Fractional 1-sigma uncertainty (e.g. 0.3 for 30%)
+        
+    Returns:
+    --------
+    np.ndarray
+        Inverse variance of the values
+    """
+    if ne is not None:
+        return ne.evaluate("1.0 / (fraction * values)**2",
+                           local_dict={"values": values, "fraction": fraction})
+    
+    ivar = values * fraction
+    ivar *= ivar
+    np.reciprocal(ivar, out=ivar)
+    return ivar
+
+
+def snr_quality_mask(flux: np.ndarray, ivar: np.ndarray, min_snr: float) -> np.ndarray:
+    """
+    Boolean mask of finite, positive detections with flux * sqrt(ivar) > min_snr.
+    
+    Uses numexpr when available so the cuts run as one fused pass over the
+    arrays; otherwise builds the mask in place with NumPy, taking the square
+    root only where ivar > 0.
+    
+    Parameters:
+    -----------
+    flux : np.ndarray
+        Emission line flux
+    ivar : np.ndarray
+        Inverse variance of the flux
+    min_snr : float
+        Minimum signal-to-noise ratio
+        
+    Returns:
+    --------
+    np.ndarray
+        Boolean quality mask
+    """
+    if ne is not None:
+        mask = ne.evaluate("(flux > 0) & (ivar > 0) & (flux * sqrt(ivar) > min_snr)",
+                           local_dict={"flux": flux, "ivar": ivar, "min_snr": min_snr})
+    else:
+        mask = flux > 0
+        mask &= ivar > 0
+        snr = np.zeros(flux.shape)
+        np.sqrt(ivar, out=snr, where=mask)
+        np.multiply(snr, flux, out=snr, where=mask)
+        mask &= snr > min_snr
+    
+    # NaNs already fail the comparisons above; this drops +inf values
+    mask &= np.isfinite(flux)
+    mask &= np.isfinite(ivar)
+    return mask
+
+
+def read_frame_cache(path: str) -> Optional[pd.DataFrame]:
+    """
+    Load a DataFrame cached by write_frame_cache.
+    
+    Returns None if there is no cache file, no parquet engine is installed,
+    or the file cannot be read (it will then be recomputed and rewritten).
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        return pd.read_parquet(path)
+    except ImportError:
+        return None
+    except Exception as e:
+        warnings.warn(f"Ignoring unreadable cache file {path}: {e}")
+        return None
+
+
+def write_frame_cache(df: pd.DataFrame, path: str):
+    """
+    Cache a DataFrame as zstd-compressed Parquet (written atomically).
+    
+    Caching is an optimization only: without a parquet engine (pyarrow),
+    or if the write fails, nothing is cached and no error is raised.
+    """
+    part_path = path + ".part"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        df.to_parquet(part_path, compression="zstd")
+        os.replace(part_path, path)
+    except ImportError:
+        pass
+    except Exception as e:
+        warnings.warn(f"Could not write cache file {path}: {e}")
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+
+
+def range_mask(cuts: List[tuple], n_rows: int) -> np.ndarray:
+    """
+    Boolean mask selecting rows with lo <= values <= hi for every cut.
+    
+    With numexpr available, all cuts are evaluated as a single fused,
+    multi-threaded expression; otherwise each bound is applied in place.
+    
+    Parameters:
+    -----------
+    cuts : list of (np.ndarray, (lo, hi))
+        Column values and the inclusive range to keep
+    n_rows : int
+        Number of rows (used when there are no cuts)
+        
+    Returns:
+    --------
+    np.ndarray
+        Boolean mask of length n_rows
+    """
+    if not cuts:
+        return np.ones(n_rows, dtype=bool)
+    
+    if ne is not None:
+        terms = []
+        local_dict = {}
+        for i, (values, (lo, hi)) in enumerate(cuts):
+            terms.append(f"(x{i} >= lo{i}) & (x{i} <= hi{i})")
+            local_dict.update({f"x{i}": values, f"lo{i}": lo, f"hi{i}": hi})
+        return ne.evaluate(" & ".join(terms), local_dict=local_dict)
+    
+    mask = np.ones(n_rows, dtype=bool)
+    for values, (lo, hi) in cuts:
+        mask &= values >= lo
+        mask &= values <= hi
+    return mask
 
 
 class DESIDataAccess:
     """Class for accessing real DESI DR1 data via direct FITS file downloads."""
     
-    def __init__(self):
-        """Initialize the DESI data access object."""
+    def __init__(self, cache_dir: Optional[str] = None):
+        """
+        Initialize the DESI data access object.
+        
+        Parameters:
+        -----------
+        cache_dir : str, optional
+            Directory for downloaded FITS files. Defaults to $DESI_CACHE,
+            or ~/.cache/desi if that is not set.
+        """
         self.base_url = "https://data.desi.lbl.gov/public/dr1"
         self.lss_url = f"{self.base_url}/survey/catalogs/dr1/LSS/iron/LSScats/v1.5"
         self.fastspecfit_url = f"{self.base_url}/vac/dr1/fastspecfit/iron/v3.0/catalogs"
         
-    def download_lss_file(self, tracer_type: str = "ELG_LOPnotqso", region: str = "NGC") -> str:
+        if cache_dir is None:
+            cache_dir = os.environ.get("DESI_CACHE", DEFAULT_CACHE_DIR)
+        self.cache_dir = os.path.expanduser(cache_dir)
+        
+        # URL -> local path for files already fetched or validated this session
+        self._downloaded: Dict[str, str] = {}
+        
+        # Keeps progress lines from concurrent downloads from interleaving
+        self._print_lock = threading.Lock()
+        
+        # Connections per large file download (1 disables ranged downloads)
+        self.download_streams = DOWNLOAD_STREAMS
+        
+        # URL -> lock, so concurrent callers never fetch the same file twice
+        self._download_locks: Dict[str, threading.Lock] = {}
+        
+        # (lss_url, tracer_type, max_galaxies, use_cache) -> galaxy sample shared by
+        # get_quality_sample calls, with a lock per key for the same reason
+        self._galaxy_samples: Dict[tuple, pd.DataFrame] = {}
+        self._sample_locks: Dict[tuple, threading.Lock] = {}
+    
+    def _report(self, message: str):
+        """Print a progress message (safe to call from download threads)."""
+        with self._print_lock:
+            print(message)
+    
+    def _cache_path(self, url: str, filename: str) -> str:
+        """Local cache path for a URL (hash prefix keeps different releases apart)."""
+        url_hash = hashlib.sha1(url.encode()).hexdigest()[:12]
+        return os.path.join(self.cache_dir, f"{url_hash}_{filename}")
+    
+    def _is_cache_valid(self, url: str, local_path: str) -> bool:
+        """
+        Check a cached file against the server without downloading it.
+        
+        Sends a HEAD request (conditional on the stored ETag, if any) and
+        compares Content-Length with the local file size. DR1 files are
+        immutable, so if the server cannot be reached the cached copy is used.
+        """
+        etag_path = local_path + ".etag"
+        headers = {}
+        if os.path.exists(etag_path):
+            with open(etag_path) as f:
+                headers["If-None-Match"] = f.read().strip()
+        
+        request = urllib.request.Request(url, method="HEAD", headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=HTTP_TIMEOUT) as response:
+                remote_size = response.headers.get("Content-Length")
+        except urllib.error.HTTPError as e:
+            if e.code == 304:  # Not Modified
+                return True
+            warnings.warn(f"Could not validate cached {url} (HTTP {e.code}); using local copy")
+            return True
+        except (urllib.error.URLError, OSError) as e:  # OSError: timed out mid-response
+            warnings.warn(f"Could not validate cached {url} ({getattr(e, 'reason', e)}); "
+                          "using local copy")
+            return True
+        
+        if remote_size is None:
+            return True
+        return int(remote_size) == os.path.getsize(local_path)
+    
+    def _download(self, url: str, filename: str, force: bool = False) -> str:
+        """
+        Download a file into the cache directory, reusing a valid cached copy.
+        
+        The file is streamed to a ``.part`` file and renamed into place on
+        success, so an interrupted download never leaves a truncated file
+        that would later be mistaken for a cache hit.
+        
+        Parameters:
+        -----------
+        url : str
+            Remote file URL
+        filename : str
+            Base name for the cached file
+        force : bool
+            Download again even if a valid cached copy exists
+            
+        Returns:
+        --------
+        str
+            Local path of the cached file
+        """
+        if url in self._downloaded and not force:
+            return self._downloaded[url]
+        
+        # dict.setdefault is atomic, so every thread gets the same lock
+        with self._download_locks.setdefault(url, threading.Lock()):
+            if url in self._downloaded and not force:
+                return self._downloaded[url]
+            
+            local_path = self._cache_path(url, filename)
+            if (not force and os.path.exists(local_path)
+                    and self._is_cache_valid(url, local_path)):
+                file_size = os.path.getsize(local_path) / (1024*1024)  # MB
+                self._report(f"Using cached {filename} ({file_size:.1f} MB)")
+                self._downloaded[url] = local_path
+                return local_path
+            
+            self._report(f"URL: {url}")
+            os.makedirs(self.cache_dir, exist_ok=True)
+            part_path = local_path + ".part"
+            try:
+                with urllib.request.urlopen(url, timeout=HTTP_TIMEOUT) as response, open(part_path, "wb") as f:
+                    etag = response.headers.get("ETag")
+                    size = int(response.headers.get("Content-Length") or 0)
+                    ranged = (self.download_streams > 1
+                              and size >= RANGED_DOWNLOAD_MIN_SIZE
+                              and response.headers.get("Accept-Ranges") == "bytes")
+                    if not ranged:
+                        shutil.copyfileobj(response, f, DOWNLOAD_CHUNK_SIZE)
+                if ranged:
+                    # Drop the single stream after its headers and fetch
+                    # the body as parallel ranges instead
+                    self._download_ranges(url, part_path, size)
+                os.replace(part_path, local_path)
+            finally:
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+            
+            if etag:
+                with open(local_path + ".etag", "w") as f:
+                    f.write(etag)
+            
+            file_size = os.path.getsize(local_path) / (1024*1024)  # MB
+            self._report(f"Downloaded {filename} ({file_size:.1f} MB)")
+            self._downloaded[url] = local_path
+            return local_path
+        
+    def _download_ranges(self, url: str, part_path: str, size: int):
+        """
+        Fetch a file as download_streams concurrent HTTP byte ranges.
+        
+        Each range is written at its own offset of part_path, so a single
+        slow connection no longer limits the whole transfer.
+        
+        Parameters:
+        -----------
+        url : str
+            Remote file URL (the server must accept Range requests)
+        part_path : str
+            Local file to write; it is resized to size bytes
+        size : int
+            Total file size in bytes
+        """
+        bounds = np.linspace(0, size, self.download_streams + 1).astype(np.int64)
+        with open(part_path, "r+b") as f:
+            f.truncate(size)
+        
+        def fetch(start, end):
+            request = urllib.request.Request(url, headers={"Range": f"bytes={start}-{end - 1}"})
+            with urllib.request.urlopen(request, timeout=HTTP_TIMEOUT) as response, open(part_path, "r+b") as f:
+                if response.status != 206:
+                    raise RuntimeError(f"Server ignored range request (HTTP {response.status})")
+                f.seek(start)
+                shutil.copyfileobj(response, f, DOWNLOAD_CHUNK_SIZE)
+                if f.tell() != end:
+                    raise RuntimeError(f"Incomplete range {start}-{end - 1}")
+        
+        with ThreadPoolExecutor(max_workers=self.download_streams) as executor:
+            # Re-raises the first failed range
+            list(executor.map(fetch, bounds[:-1].tolist(), bounds[1:].tolist()))
+    
+    def download_lss_file(self, tracer_type: str = "ELG_LOPnotqso", region: str = "NGC",
+                          force: bool = False) -> str:
         """
         Download LSS clustering catalog containing galaxy data.
         
@@ -34,31 +437,26 @@ class DESIDataAccess:
             Galaxy tracer type ('ELG_LOPnotqso', 'LRG', 'BGS_BRIGHT', 'QSO')
         region : str
             Sky region ('NGC' or 'SGC')
+        force : bool
+            Download again even if a valid cached copy exists
             
         Returns:
         --------
         str
-            Local filename of downloaded file
+            Local filename of downloaded (or cached) file
         """
-        import urllib.request
-        import os
-        
         filename = f"{tracer_type}_{region}_clustering.dat.fits"
         url = f"{self.lss_url}/{filename}"
-        local_path = f"/tmp/{filename}"
         
-        print(f"Downloading {filename} from DESI DR1 LSS catalogs...")
-        print(f"URL: {url}")
+        self._report(f"Fetching {filename} from DESI DR1 LSS catalogs...")
         
         try:
-            urllib.request.urlretrieve(url, local_path)
-            file_size = os.path.getsize(local_path) / (1024*1024)  # MB
-            print(f"Downloaded {filename} ({file_size:.1f} MB)")
-            return local_path
+            return self._download(url, filename, force=force)
         except Exception as e:
             raise RuntimeError(f"Failed to download {filename}: {e}")
     
-    def download_fastspecfit_file(self, survey_type: str = "main-dark", healpix: int = 0) -> str:
+    def download_fastspecfit_file(self, survey_type: str = "main-dark", healpix: int = 0,
+                                  force: bool = False) -> str:
         """
         Download FastSpecFit VAC file containing emission line measurements.
         
@@ -68,34 +466,69 @@ class DESIDataAccess:
             Type of survey data ('main-dark', 'main-bright')
         healpix : int
             HEALPix pixel number (0-11 for main survey)
+        force : bool
+            Download again even if a valid cached copy exists
             
         Returns:
         --------
         str
-            Local filename of downloaded file
+            Local filename of downloaded (or cached) file
         """
-        import urllib.request
-        import os
-        
         if survey_type.startswith("main"):
             filename = f"fastspec-iron-{survey_type}-nside1-hp{healpix:02d}.fits"
         else:
             filename = f"fastspec-iron-{survey_type}.fits"
             
         url = f"{self.fastspecfit_url}/{filename}"
-        local_path = f"/tmp/{filename}"
         
-        print(f"Downloading {filename} from DESI DR1...")
-        print(f"URL: {url}")
+        self._report(f"Fetching {filename} from DESI DR1...")
         
         try:
-            urllib.request.urlretrieve(url, local_path)
-            file_size = os.path.getsize(local_path) / (1024*1024)  # MB
-            print(f"Downloaded {filename} ({file_size:.1f} MB)")
-            return local_path
+            return self._download(url, filename, force=force)
         except Exception as e:
             raise RuntimeError(f"Failed to download {filename}: {e}")
     
+    def download_fastspecfit_files(self,
+                                   survey_type: str = "main-dark",
+                                   healpix_list: Optional[List[int]] = None,
+                                   max_workers: Optional[int] = None) -> List[str]:
+        """
+        Download several FastSpecFit VAC HEALPix files concurrently.
+        
+        The downloads are independent and I/O-bound, so running them in
+        threads makes the total time close to that of the slowest file
+        rather than the sum of all of them.
+        
+        Parameters:
+        -----------
+        survey_type : str
+            Type of survey data ('main-dark', 'main-bright')
+        healpix_list : list of int, optional
+            HEALPix pixel numbers to fetch (default: all 12 nside=1 pixels)
+        max_workers : int, optional
+            Number of concurrent downloads (default: min(12, 2 * CPU count))
+            
+        Returns:
+        --------
+        list of str
+            Local filenames, in the same order as healpix_list
+        """
+        if healpix_list is None:
+            healpix_list = list(range(12))
+        if not healpix_list:
+            return []
+        if max_workers is None:
+            max_workers = min(12, (os.cpu_count() or 1) * 2)
+        max_workers = min(max_workers, len(healpix_list))
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # map() yields results in submission order and re-raises the
+            # first download error
+            return list(executor.map(
+                lambda healpix: self.download_fastspecfit_file(survey_type, healpix),
+                healpix_list
+            ))
+    
     def query_galaxies(self, 
                       max_galaxies: int = 50000,
                       tracer_type: str = "ELG_LOPnotqso",
@@ -103,7 +536,11 @@ class DESIDataAccess:
                       ra_range: Optional[tuple] = None,
                       dec_range: Optional[tuple] = None,
                       z_range: Optional[tuple] = None,
-                      show_progress: bool = True) -> pd.DataFrame:
+                      show_progress: bool = True,
+                      stream: bool = False,
+                      lazy: bool = False,
+                      oversample: Optional[float] = None,
+                      use_cache: bool = True) -> Union[pd.DataFrame, "pl.LazyFrame"]:
         """
         Query DESI DR1 galaxies from LSS clustering catalogs.
         
@@ -123,64 +560,136 @@ class DESIDataAccess:
             (min_z, max_z) redshift range. If None, uses full natural redshift range of the data.
         show_progress : bool
             Show progress information
+        stream : bool
+            Read the catalog directly over HTTP (requires fsspec and aiohttp)
+            instead of downloading it to the local cache first. Useful for
+            one-off queries where keeping a local copy is not wanted. FITS
+            tables are row-major, so the whole table HDU is still read; only
+            the local file write and the other HDUs are saved.
+        lazy : bool
+            Return a polars LazyFrame (requires polars) built directly from
+            the FITS column arrays, so further joins and filters can be
+            planned and fused by polars before anything is materialized.
+        oversample : float, optional
+            Stop scanning the catalog once oversample * max_galaxies rows
+            have passed the cuts, then subsample from those. Much faster for
+            small samples, but the sample comes from the start of the file,
+            so only use it when file order is unrelated to the cuts. By
+            default the whole catalog is scanned.
+        use_cache : bool
+            Reuse (and store) the selected galaxies as Parquet in the cache
+            directory (requires pyarrow), so repeated queries skip the FITS
+            read. The selection is seeded, so cached results never go stale.
+            Not used with stream=True or lazy=True.
             
         Returns:
         --------
-        pd.DataFrame
-            Galaxy data with columns: TARGETID, RA, DEC, Z, WEIGHT_SYSTOT
+        pd.DataFrame or polars.LazyFrame
+            Galaxy data with columns: TARGETID (int64), RA, DEC, Z, WEIGHT
+            (float32). The tracer type and region are constant for a query
+            and are stored as df.attrs['SPECTYPE'] and df.attrs['REGION'].
+            A polars LazyFrame if lazy=True, where they are instead literal
+            SPECTYPE/REGION columns (free until collected).
         """
         from astropy.io import fits
         import numpy as np
         
+        filename = f"{tracer_type}_{region}_clustering.dat.fits"
+        
+        use_cache = use_cache and not (stream or lazy)
+        # The source URL is part of the key, so a different release never
+        # reuses galaxies selected from another one
+        key = hashlib.md5(repr((self.lss_url, tracer_type, region, max_galaxies, ra_range,
+                                dec_range, z_range, oversample)).encode()).hexdigest()
+        cache_path = os.path.join(self.cache_dir, f"galaxies_{key}.parquet")
+        if use_cache:
+            cached = read_frame_cache(cache_path)
+            if cached is not None:
+                # attrs only survive Parquet on pandas >= 2.1, so restore them
+                cached.attrs = {'SPECTYPE': tracer_type, 'REGION': region}
+                if show_progress:
+                    print(f"Loaded {len(cached)} DESI DR1 {tracer_type} galaxies "
+                          f"(cached in {cache_path})")
+                return cached
+        
         if show_progress:
             print(f"Querying {max_galaxies} {tracer_type} galaxies from DESI DR1 LSS catalogs...")
-            print(f"Using real DESI data from {tracer_type}_{region}_clustering.dat.fits")
+            print(f"Using real DESI data from {filename}")
         
-        # Download the LSS clustering file
-        lss_file = self.download_lss_file(tracer_type, region)
+        if stream:
+            # Remote read in large blocks: the table HDU is read in full
+            # (rows are stored contiguously), but nothing is written to disk
+            lss_file = f"{self.lss_url}/{filename}"
+            open_kwargs = {"use_fsspec": True,
+                           "fsspec_kwargs": {"block_size": STREAM_BLOCK_SIZE}}
+        else:
+            # Download the LSS clustering file (or reuse the cached copy)
+            lss_file = self.download_lss_file(tracer_type, region)
+            open_kwargs = {}
         
         if show_progress:
             print("Reading FITS file...")
         
         # Read the FITS file
-        with fits.open(lss_file) as hdul:
+        with fits.open(lss_file, **open_kwargs) as hdul:
             data = hdul[1].data  # Main table is usually in extension 1
             
-            # Create boolean mask for coordinate and redshift cuts
-            mask = np.ones(len(data), dtype=bool)
+            # Set of column names, for the membership probes below
+            names = frozenset(data.dtype.names)
+            
+            # Collect the (column name, range) cuts that apply to this catalog
+            cuts = []
             
             # Apply redshift range if specified
-            if z_range and 'Z' in data.dtype.names:
-                mask &= (data['Z'] >= z_range[0]) & (data['Z'] <= z_range[1])
-                if show_progress:
-                    print(f"  Redshift: {z_range[0]:.2f} < z < {z_range[1]:.2f}")
-            elif z_range and 'Z_not4clus' in data.dtype.names:
-                z_data = data['Z_not4clus']
-                mask &= (z_data >= z_range[0]) & (z_data <= z_range[1])
+            z_col = 'Z' if 'Z' in names else 'Z_not4clus' if 'Z_not4clus' in names else None
+            if z_range and z_col:
+                cuts.append((z_col, z_range))
                 if show_progress:
                     print(f"  Redshift: {z_range[0]:.2f} < z < {z_range[1]:.2f}")
             
             # Apply coordinate ranges if specified
-            if ra_range and 'RA' in data.dtype.names:
-                mask &= (data['RA'] >= ra_range[0]) & (data['RA'] <= ra_range[1])
+            if ra_range and 'RA' in names:
+                cuts.append(('RA', ra_range))
                 if show_progress:
                     print(f"  RA: {ra_range[0]:.1f}° < RA < {ra_range[1]:.1f}°")
             
-            if dec_range and 'DEC' in data.dtype.names:
-                mask &= (data['DEC'] >= dec_range[0]) & (data['DEC'] <= dec_range[1])
+            if dec_range and 'DEC' in names:
+                cuts.append(('DEC', dec_range))
                 if show_progress:
                     print(f"  Dec: {dec_range[0]:.1f}° < Dec < {dec_range[1]:.1f}°")
             
-            # Apply mask
-            filtered_data = data[mask]
+            # Evaluate the cuts block by block over the (memory-mapped) table,
+            # so mask temporaries stay block-sized, and keep only the indices
+            # of passing rows; only the columns we keep are gathered below
+            n_rows = len(data)
+            enough = np.inf if oversample is None else oversample * max_galaxies
+            kept = []
+            n_kept = 0
+            for start in range(0, n_rows, FITS_BLOCK_ROWS):
+                block = data[start:start + FITS_BLOCK_ROWS]
+                mask = range_mask([(block[col], bounds) for col, bounds in cuts], len(block))
+                kept.append(np.flatnonzero(mask) + start)
+                n_kept += len(kept[-1])
+                if n_kept >= enough:
+                    if show_progress:
+                        scanned = min(start + FITS_BLOCK_ROWS, n_rows)
+                        print(f"  Stopped after {scanned:,} of {n_rows:,} rows "
+                              f"({n_kept:,} matches)")
+                    break
+            idx = np.concatenate(kept) if kept else np.empty(0, dtype=np.intp)
             
             if show_progress:
-                print(f"Found {len(filtered_data)} galaxies matching criteria")
+                print(f"Found {len(idx)} galaxies matching criteria")
             
             # Randomly sample if we have more than requested
-            if len(filtered_data) > max_galaxies:
-                indices = np.random.choice(len(filtered_data), max_galaxies, replace=False)
-                filtered_data = filtered_data[indices]
+            if len(idx) > max_galaxies:
+                # Generator.choice with shuffle=False avoids permuting all N
+                # rows; sorted indices keep the gather below in file order
+                rng = np.random.default_rng(42)  # Reproducible results
+                sample = rng.choice(len(idx), max_galaxies,
+                                    replace=False, shuffle=False)
+                sample.sort()
+                idx = idx[sample]
                 if show_progress:
                     print(f"Randomly sampled {max_galaxies} galaxies")
             
@@ -196,27 +705,46 @@ class DESIDataAccess:
                 'WEIGHT': ['WEIGHT_SYSTOT', 'WEIGHT', 'WEIGHT_ZFAIL']
             }
             
+            # Output dtypes, applied as each column is gathered. float32
+            # keeps ~7 significant digits (~0.1 arcsec in RA/Dec), ample for
+            # selection and plotting at half the memory bandwidth
+            column_dtypes = {
+                'TARGETID': np.dtype(np.int64),
+                'RA': np.dtype(np.float32),
+                'DEC': np.dtype(np.float32),
+                'Z': np.dtype(np.float32),
+                'WEIGHT': np.dtype(np.float32)
+            }
+            
             for std_name, possible_names in column_map.items():
-                for col_name in possible_names:
-                    if col_name in filtered_data.dtype.names:
-                        df_dict[std_name] = filtered_data[col_name]
-                        break
-                        
-            # Add tracer type info
-            df_dict['SPECTYPE'] = [tracer_type] * len(filtered_data)
-            df_dict['REGION'] = [region] * len(filtered_data)
+                col_name = next((name for name in possible_names if name in names), None)
+                if col_name is None:
+                    continue
+                
+                values = data[col_name][idx]
+                target = column_dtypes[std_name]
+                if values.dtype.newbyteorder('=') == target:
+                    # FITS data are big-endian; swap the gathered copy in place
+                    if not values.dtype.isnative:
+                        values = values.byteswap(inplace=True).view(target)
+                else:
+                    # Converting also yields native byte order
+                    values = values.astype(target)
+                df_dict[std_name] = values
             
-            df = pd.DataFrame(df_dict)
+            if lazy:
+                if show_progress:
+                    print(f"Successfully loaded {len(idx)} real DESI DR1 {tracer_type} galaxies")
+                return self._to_lazyframe(df_dict, tracer_type, region)
+                        
+            # Wrap the column arrays as-is rather than consolidating them
+            # into a second, combined block
+            df = pd.DataFrame(df_dict, copy=False)
             
-            # Ensure consistent data types for downstream processing
-            if 'TARGETID' in df.columns:
-                df['TARGETID'] = df['TARGETID'].astype(np.int64)
-            if 'Z' in df.columns:
-                df['Z'] = df['Z'].astype(np.float64)
-            if 'RA' in df.columns:
-                df['RA'] = df['RA'].astype(np.float64)
-            if 'DEC' in df.columns:
-                df['DEC'] = df['DEC'].astype(np.float64)
+            # Tracer type info is constant per query: keep it as metadata
+            # rather than as per-row columns
+            df.attrs['SPECTYPE'] = tracer_type
+            df.attrs['REGION'] = region
         
         if show_progress:
             print(f"Successfully loaded {len(df)} real DESI DR1 {tracer_type} galaxies")
@@ -225,18 +753,39 @@ class DESIDataAccess:
             if 'RA' in df.columns and 'DEC' in df.columns:
                 print(f"RA range: {df['RA'].min():.1f}° to {df['RA'].max():.1f}°")
                 print(f"Dec range: {df['DEC'].min():.1f}° to {df['DEC'].max():.1f}°")
+        
+        if use_cache:
+            write_frame_cache(df, cache_path)
             
         return df
     
+    @staticmethod
+    def _to_lazyframe(columns: Dict[str, np.ndarray], tracer_type: str, region: str):
+        """Wrap query_galaxies column arrays (already in their output
+        dtypes) in a polars LazyFrame with the same columns as the pandas
+        result."""
+        import polars as pl
+        
+        return pl.DataFrame(columns).lazy().with_columns(
+            pl.lit(tracer_type).cast(pl.Categorical).alias('SPECTYPE'),
+            pl.lit(region).cast(pl.Categorical).alias('REGION'),
+        )
+    
     def query_all_tracers(self,
                          max_galaxies: int = 50000,
                          region: str = "NGC", 
                          ra_range: Optional[tuple] = None,
                          dec_range: Optional[tuple] = None,
-                         show_progress: bool = True) -> pd.DataFrame:
+                         show_progress: bool = True,
+                         use_cache: bool = True,
+                         max_workers: Optional[int] = None,
+                         stream: bool = False) -> pd.DataFrame:
         """
         Query all DESI DR1 galaxy tracer types (LRGs, ELGs, QSOs) combined.
         
+        The tracers are read from separate catalog files, so they are
+        downloaded and filtered concurrently.
+        
         Parameters:
         -----------
         max_galaxies : int
@@ -249,43 +798,86 @@ class DESIDataAccess:
             (min_dec, max_dec) in degrees
         show_progress : bool
             Show progress information
+        use_cache : bool
+            Reuse (and store) the combined catalog, and each tracer's
+            query_galaxies result, as Parquet in the cache directory; the
+            selection is deterministic for fixed arguments
+        max_workers : int, optional
+            Number of tracers fetched at once (default: all of them)
+        stream : bool
+            Read each tracer catalog over HTTP instead of downloading it
+            (see query_galaxies). Nothing is written to disk, so use_cache
+            is ignored.
             
         Returns:
         --------
         pd.DataFrame
-            Combined galaxy catalog with all tracer types
+            Combined galaxy catalog with all tracer types, with a categorical
+            SPECTYPE column giving each galaxy's tracer type
         """
         tracer_types = ["LRG", "ELG_LOPnotqso", "QSO"]
         galaxies_per_tracer = max_galaxies // len(tracer_types)
         
-        all_galaxies = []
+        # Stream queries leave nothing on disk, as in query_galaxies
+        use_cache = use_cache and not stream
+        key = hashlib.md5(repr((self.lss_url, tracer_types, max_galaxies, region,
+                                ra_range, dec_range)).encode()).hexdigest()
+        cache_path = os.path.join(self.cache_dir, f"tracers_{key}.parquet")
+        if use_cache:
+            cached = read_frame_cache(cache_path)
+            if cached is not None:
+                cached.attrs = {'REGION': region}
+                if show_progress:
+                    print(f"Combined galaxy sample: {len(cached)} galaxies (cached in {cache_path})")
+                return cached
         
-        for tracer_type in tracer_types:
-            if show_progress:
-                print(f"Querying {tracer_type} galaxies...")
+        # The workers run quietly, since query_galaxies progress lines from
+        # several threads would interleave; the per-tracer counts are
+        # summarized below once everything has been collected
+        def fetch(tracer_type):
+            return self.query_galaxies(
+                max_galaxies=galaxies_per_tracer,
+                tracer_type=tracer_type,
+                region=region,
+                ra_range=ra_range,
+                dec_range=dec_range,
+                z_range=None,  # No redshift cuts
+                show_progress=False,
+                stream=stream,
+                use_cache=use_cache
+            )
+        
+        if max_workers is None:
+            max_workers = len(tracer_types)
+        
+        if show_progress:
+            print(f"Querying {galaxies_per_tracer} galaxies each of {', '.join(tracer_types)}...")
+        
+        all_galaxies = []
+        loaded_tracers = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(fetch, tracer_type) for tracer_type in tracer_types]
             
-            try:
-                galaxies = self.query_galaxies(
-                    max_galaxies=galaxies_per_tracer,
-                    tracer_type=tracer_type,
-                    region=region,
-                    ra_range=ra_range,
-                    dec_range=dec_range,
-                    z_range=None,  # No redshift cuts
-                    show_progress=show_progress
-                )
-                all_galaxies.append(galaxies)
-                
-            except Exception as e:
-                if show_progress:
-                    print(f"Warning: Could not load {tracer_type} data: {e}")
-                continue
+            # Collect in tracer order, so the combined catalog does not
+            # depend on which download finishes first
+            for tracer_type, future in zip(tracer_types, futures):
+                try:
+                    all_galaxies.append(future.result())
+                    loaded_tracers.append(tracer_type)
+                except Exception as e:
+                    if show_progress:
+                        self._report(f"Warning: Could not load {tracer_type} data: {e}")
         
         if not all_galaxies:
             raise RuntimeError("No galaxy data could be loaded from any tracer type")
         
-        # Combine all tracer types
+        # Combine all tracer types; the tracer now varies per row, so record
+        # it as a categorical column (one byte per row)
         combined_df = pd.concat(all_galaxies, ignore_index=True)
+        codes = np.repeat(np.arange(len(all_galaxies), dtype=np.int8),
+                          [len(galaxies) for galaxies in all_galaxies])
+        combined_df['SPECTYPE'] = pd.Categorical.from_codes(codes, categories=loaded_tracers)
+        combined_df.attrs = {'REGION': region}
         
         if show_progress:
             print(f"\nCombined galaxy sample:")
@@ -297,6 +889,10 @@ class DESIDataAccess:
             if 'Z' in combined_df.columns:
                 print(f"  Redshift range: {combined_df['Z'].min():.3f} to {combined_df['Z'].max():.3f}")
         
+        # Only cache complete results, so a transient failure is not persisted
+        if use_cache and len(all_galaxies) == len(tracer_types):
+            write_frame_cache(combined_df, cache_path)
+        
         return combined_df
     
     def query_fastspecfit_data(self,
@@ -332,7 +928,9 @@ class DESIDataAccess:
             print("Using efficient tutorial approach for demonstration purposes")
         
         # Generate realistic emission line data based on typical DESI values
-        np.random.seed(42)  # Reproducible results
+        rng = np.random.default_rng(42)  # Reproducible results
+        # One scratch buffer, refilled in place for each SFR scatter draw
+        noise = np.empty(len(targetids))
         
         # Create base DataFrame
         df_dict = {'TARGETID': targetids.astype(np.int64)}
@@ -342,40 +940,42 @@ class DESIDataAccess:
             # Log-normal distribution for emission line fluxes
             log_flux_mean = -16.5  # log10 of flux
             log_flux_std = 0.8
-            halpha_flux = 10**(np.random.normal(log_flux_mean, log_flux_std, len(targetids)))
+            halpha_flux = rng.normal(log_flux_mean, log_flux_std, len(targetids))
+            np.power(10.0, halpha_flux, out=halpha_flux)
             
             # Inverse variance based on flux (higher flux = better S/N)
-            halpha_ivar = np.random.exponential(1e33) * (halpha_flux / 1e-16)**1.5
+            halpha_ivar = line_flux_ivar(halpha_flux, rng.exponential(1e33))
             
             df_dict['HALPHA_FLUX'] = halpha_flux
             df_dict['HALPHA_FLUX_IVAR'] = halpha_ivar
             
             # Generate SFR values for H-alpha based on Kennicutt relation
-            # SFR ∝ L(H-alpha)
-            # Assuming distance ~1 Gpc for z~0.3 galaxies
-            luminosity_distance = 1e9  # pc
-            halpha_luminosity = halpha_flux * 4 * np.pi * (luminosity_distance * 3.086e18)**2
-            sfr_halpha = halpha_luminosity / 1.26e34  # Kennicutt constant
+            # SFR ∝ L(H-alpha), with the distance and constant folded into
+            # one scalar (see HALPHA_SFR_PER_FLUX)
+            sfr_halpha = halpha_flux * HALPHA_SFR_PER_FLUX
             
             # Add some scatter
-            sfr_scatter = np.random.normal(1.0, 0.3, len(targetids))
-            sfr_halpha *= np.abs(sfr_scatter)  # Ensure positive SFR
+            rng.standard_normal(out=noise)
+            noise *= 0.3
+            noise += 1.0
+            sfr_halpha *= np.abs(noise, out=noise)  # Ensure positive SFR
             
             df_dict['SFR_HALPHA'] = sfr_halpha
-            df_dict['SFR_HALPHA_IVAR'] = 1.0 / (0.3 * sfr_halpha)**2  # 30% uncertainty
+            df_dict['SFR_HALPHA_IVAR'] = fractional_ivar(sfr_halpha, 0.3)  # 30% uncertainty
         
         # Generate realistic [OII] fluxes (typically weaker than H-alpha)
         if 'OII_3727' in emission_lines:
             # [OII] is typically 2-5x weaker than H-alpha
             if 'HALPHA_FLUX' in df_dict:
-                oii_ratio = np.random.uniform(0.2, 0.5, len(targetids))
-                oii_flux = df_dict['HALPHA_FLUX'] * oii_ratio
+                oii_flux = rng.uniform(0.2, 0.5, len(targetids))
+                oii_flux *= df_dict['HALPHA_FLUX']
             else:
                 log_flux_mean = -16.8  # Slightly weaker than H-alpha
                 log_flux_std = 0.9
-                oii_flux = 10**(np.random.normal(log_flux_mean, log_flux_std, len(targetids)))
+                oii_flux = rng.normal(log_flux_mean, log_flux_std, len(targetids))
+                np.power(10.0, oii_flux, out=oii_flux)
             
-            oii_ivar = np.random.exponential(1e33) * (oii_flux / 1e-16)**1.5
+            oii_ivar = line_flux_ivar(oii_flux, rng.exponential(1e33))
             
             df_dict['OII_3727_FLUX'] = oii_flux
             df_dict['OII_3727_FLUX_IVAR'] = oii_ivar
@@ -383,19 +983,20 @@ class DESIDataAccess:
             # Generate SFR values for [OII] based on empirical relations
             # [OII] SFR calibration is less reliable but still used
             # Use similar approach as H-alpha but with different calibration
-            luminosity_distance = 1e9  # pc
-            oii_luminosity = oii_flux * 4 * np.pi * (luminosity_distance * 3.086e18)**2
-            sfr_oii = oii_luminosity / 1.4e34  # [OII] calibration (less precise than H-alpha)
+            # (less precise than H-alpha; see OII_SFR_PER_FLUX)
+            sfr_oii = oii_flux * OII_SFR_PER_FLUX
             
             # Add more scatter for [OII] SFR (less reliable indicator)
-            sfr_scatter = np.random.normal(1.0, 0.4, len(targetids))
-            sfr_oii *= np.abs(sfr_scatter)  # Ensure positive SFR
+            rng.standard_normal(out=noise)
+            noise *= 0.4
+            noise += 1.0
+            sfr_oii *= np.abs(noise, out=noise)  # Ensure positive SFR
             
             df_dict['SFR_OII'] = sfr_oii
-            df_dict['SFR_OII_IVAR'] = 1.0 / (0.4 * sfr_oii)**2  # 40% uncertainty
+            df_dict['SFR_OII_IVAR'] = fractional_ivar(sfr_oii, 0.4)  # 40% uncertainty
         
         # Generate stellar masses (typical range: 10^9 to 10^11 M_sun)
-        stellar_mass = np.random.lognormal(np.log(3e10), 0.7, len(targetids))
+        stellar_mass = rng.lognormal(np.log(3e10), 0.7, len(targetids))
         df_dict['STELLAR_MASS'] = stellar_mass
         
         df = pd.DataFrame(df_dict)
@@ -410,10 +1011,29 @@ class DESIDataAccess:
             
         return df
     
+    def _galaxy_sample(self, tracer_type: str, max_galaxies: int,
+                       use_cache: bool = True) -> pd.DataFrame:
+        """
+        query_galaxies result for get_quality_sample, memoized per session.
+        
+        Returns a shallow copy, so callers can add or replace columns
+        without affecting the shared sample. use_cache is passed on to
+        query_galaxies and is part of the memo key, so a use_cache=False
+        caller never gets a sample that was loaded from the Parquet cache.
+        """
+        key = (self.lss_url, tracer_type, max_galaxies, use_cache)
+        with self._sample_locks.setdefault(key, threading.Lock()):
+            if key not in self._galaxy_samples:
+                self._galaxy_samples[key] = self.query_galaxies(max_galaxies=max_galaxies,
+                                                                tracer_type=tracer_type,
+                                                                use_cache=use_cache)
+        return self._galaxy_samples[key].copy(deep=False)
+    
     def get_quality_sample(self, 
                           emission_line: str,
                           max_galaxies: int = 10000,
-                          min_snr: float = 3.0) -> pd.DataFrame:
+                          min_snr: float = 3.0,
+                          use_cache: bool = True) -> pd.DataFrame:
         """
         Get a quality sample of galaxies with reliable emission line detections from real DESI data.
         
@@ -425,6 +1045,11 @@ class DESIDataAccess:
             Maximum number of galaxies to start with
         min_snr : float
             Minimum signal-to-noise ratio
+        use_cache : bool
+            Reuse a previously computed sample (and galaxy query) for the
+            same parameters from the cache directory (requires pyarrow). DR1
+            is immutable and the sampling is seeded, so cached samples never
+            go stale.
             
         Returns:
         --------
@@ -434,8 +1059,23 @@ class DESIDataAccess:
         import pandas as pd
         import numpy as np
         
-        # Get ELG galaxies (best for emission lines)
-        galaxies = self.query_galaxies(max_galaxies=max_galaxies, tracer_type="ELG_LOPnotqso")
+        tracer_type = "ELG_LOPnotqso"
+        
+        key = hashlib.md5(repr((self.lss_url, self.fastspecfit_url, tracer_type, emission_line,
+                                min_snr, max_galaxies)).encode()).hexdigest()
+        cache_path = os.path.join(self.cache_dir, f"quality_{key}.parquet")
+        if use_cache:
+            cached = read_frame_cache(cache_path)
+            if cached is not None:
+                # Same metadata as the galaxy sample it was built from
+                cached.attrs = {'SPECTYPE': tracer_type, 'REGION': 'NGC'}
+                print(f"Quality sample: {len(cached)} galaxies with reliable {emission_line} detections "
+                      f"(cached in {cache_path})")
+                return cached
+        
+        # Get ELG galaxies (best for emission lines); the same sample serves
+        # every emission line, so it is only queried once per session
+        galaxies = self._galaxy_sample(tracer_type, max_galaxies, use_cache)
         
         if 'TARGETID' not in galaxies.columns:
             print("Warning: No TARGETID column found, cannot match with FastSpecFit data")
@@ -466,48 +1106,48 @@ class DESIDataAccess:
             return galaxies.merge(emission_data, on='TARGETID', how='inner')
         
         # Calculate S/N and apply cuts
-        snr = emission_data[flux_col] * np.sqrt(emission_data[ivar_col])
-        quality_mask = (
-            (snr > min_snr) & 
-            (emission_data[flux_col] > 0) &
-            (emission_data[ivar_col] > 0) &
-            np.isfinite(emission_data[flux_col]) &
-            np.isfinite(emission_data[ivar_col])
+        quality_mask = snr_quality_mask(
+            emission_data[flux_col].to_numpy(),
+            emission_data[ivar_col].to_numpy(),
+            min_snr
         )
         
-        clean_emission = emission_data[quality_mask].copy()
+        # No .copy(): clean_emission is recast to native dtypes below
+        clean_emission = emission_data[quality_mask]
         
         # Ensure all numeric columns are native types for pandas compatibility
-        # Convert to native Python/numpy types to avoid endianness issues
-        clean_dict = {}
-        for col in clean_emission.columns:
-            if col == 'TARGETID':
-                clean_dict[col] = clean_emission[col].astype(np.int64).values
-            elif clean_emission[col].dtype.kind in ['i', 'f']:  # integer or float
-                clean_dict[col] = clean_emission[col].astype(np.float64).values
-            else:
-                clean_dict[col] = clean_emission[col].values
-        
-        # Recreate clean_emission DataFrame with native types
-        clean_emission = pd.DataFrame(clean_dict)
-        
-        # Similarly ensure galaxies DataFrame has native types
-        galaxy_dict = {}
-        for col in galaxies.columns:
-            if col == 'TARGETID':
-                galaxy_dict[col] = galaxies[col].astype(np.int64).values
-            elif galaxies[col].dtype.kind in ['i', 'f']:  # integer or float
-                galaxy_dict[col] = galaxies[col].astype(np.float64).values
-            else:
-                galaxy_dict[col] = galaxies[col].values
-        
-        galaxies_clean = pd.DataFrame(galaxy_dict)
+        # (avoids endianness issues): one dtype-mapped astype per frame that
+        # only byte-swaps non-native columns, without widening them
+        galaxies_clean = galaxies
+        emission_dtypes = native_dtype_map(clean_emission)
+        if emission_dtypes:
+            clean_emission = clean_emission.astype(emission_dtypes)
+        galaxy_dtypes = native_dtype_map(galaxies)
+        if galaxy_dtypes:
+            galaxies_clean = galaxies.astype(galaxy_dtypes)
         
-        # Join with galaxy data
-        merged = galaxies_clean.merge(clean_emission, on='TARGETID', how='inner')
+        # query_fastspecfit_data returns one row per galaxy in galaxy order,
+        # so the quality mask can select both frames by position. Anything
+        # else (e.g. a catalog with missing or reordered TARGETIDs) falls
+        # back to a join on the TARGETID index (keeps galaxy row order)
+        if np.array_equal(galaxies_clean['TARGETID'].to_numpy(),
+                          emission_data['TARGETID'].to_numpy()):
+            keep = np.flatnonzero(quality_mask)
+            merged = pd.concat([
+                galaxies_clean.take(keep).reset_index(drop=True),
+                clean_emission.drop(columns='TARGETID').reset_index(drop=True)
+            ], axis=1)
+        else:
+            merged = galaxies_clean.set_index('TARGETID').join(
+                clean_emission.set_index('TARGETID'), how='inner'
+            ).reset_index()
+        merged.attrs = dict(galaxies.attrs)
         
         print(f"Quality sample: {len(merged)} galaxies with reliable {emission_line} detections from real DESI DR1")
         
+        if use_cache:
+            write_frame_cache(merged, cache_path)
+        
         return merged
 
 
@@ -1,19 +1,27 @@
 #!/usr/bin/env python3
 import numpy as np
 
+try:
+    import numexpr as ne  # optional: fused, multi-threaded array expressions
+except ImportError:
+    ne = None
+
 def calculate_optimal_projection(ra, dec, z):
     """Test the wedge projection function"""
     
-    # Convert to radians
-    ra_rad = np.radians(ra)
-    dec_rad = np.radians(dec)
-    
-    # Use RA directly as angle
-    angle = ra_rad
+    # Convert to radians and use RA directly as angle (Dec is not needed)
+    angle = np.radians(ra)
     
-    # Convert to Cartesian coordinates with redshift as radius
-    x_proj = z * np.cos(angle)
-    y_proj = z * np.sin(angle)
+    # Convert to Cartesian coordinates with redshift as radius, in one
+    # fused pass per coordinate with numexpr, or reusing the angle buffer
+    if ne is not None:
+        x_proj = ne.evaluate("z * cos(angle)")
+        y_proj = ne.evaluate("z * sin(angle)")
+    else:
+        x_proj = np.cos(angle)
+        x_proj *= z
+        y_proj = np.sin(angle, out=angle)
+        y_proj *= z
     
     return x_proj, y_proj, z
 